@@ -4,94 +4,121 @@
     scanning the post titles for item mentions and replying with data
 """
 import requests
+import numpy as np
 import praw
 import prawcore
+import atexit
 import datetime
+import functools
 import os
+import pickle
+import signal
+import sys
 import traceback
 
 from STSTypes import *
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
-from bs4 import BeautifulSoup as soup
+from selectolax.lexbor import LexborHTMLParser
 from urllib3.exceptions import InsecureRequestWarning
-from strsimpy.jaro_winkler import JaroWinkler
+from rapidfuzz import process
+from rapidfuzz.distance import Jaro, Prefix
 
 sts_descr_site = 'http://127.0.0.1:5000/'
 describe_path = 'describe'
 update_path = 'update'
+log_file = open('sts_crawler.log', 'a', encoding='utf-8', buffering=8192)
+SESSION = requests.Session()
 
 def log(text):
     """helper to log to file and print at the same time"""
-    with open('sts_crawler.log', 'a', encoding='utf-8') as logger:
-        log_text = text.replace('\n', '\n\t')
-        logger.write(f'\n{str(datetime.datetime.utcnow())}: {log_text}')
+    log_text = text.replace('\n', '\n\t')
+    log_file.write(f'\n{str(datetime.datetime.utcnow())}: {log_text}')
+    log_file.flush()
     print(text)
 
 
+def jaro_winkler(word, choices, coefs, score_cutoff=0):
+    """scores word against every string in choices at once.
+        Matches strsimpy's JaroWinkler, whose prefix bonus is not capped at
+        4 characters, so the match thresholds keep their meaning.
+        coefs holds min(0.1, 1 / longer length) for each pair, see
+        prefix_coefs. Pairs whose Jaro score falls below score_cutoff
+        are scored 0
+    """
+    jaro = process.cdist([word], choices, scorer=Jaro.normalized_similarity,
+                         dtype=np.float64, score_cutoff=score_cutoff)[0]
+    prefix = process.cdist([word], choices, scorer=Prefix.similarity,
+                           dtype=np.int32)[0]
+    return np.where(jaro > 0.7, jaro + coefs * prefix * (1 - jaro), jaro)
+
+
+def prefix_coefs(word, choice_coefs):
+    """the jaro_winkler prefix coefficients of word against choices, given
+        choice_coefs = min(0.1, 1 / len(choice)) for each choice
+    """
+    return np.minimum(choice_coefs, min(0.1, 1.0 / max(len(word), 1)))
+
+
 class STSWikiReader:
     """Reads data from website, creates a lookup map of item names, and does
         soft string matching to find possible mentions of the item parsed
     """
-    strcmp = JaroWinkler()
+    # odd symbols and joining characters become spaces, single quotes go
+    _FORMAT_TABLE = str.maketrans('?,.!():"+[]-_', ' ' * 13, "'’")
 
     def __init__(self, name, links, ignore_list, parse_names):
         self.last_update = datetime.datetime.utcnow()
         self.name = name
         self.links = links
         self.ignore_list = ignore_list
+        self.ignore_set = set(ignore_list)
         self.parse_names = parse_names
         self.base_set = set()
+        self._buckets = dict()
         self.real_names = set()
         self.fake_name_map = dict()
-        self.cur = None
         self.max_name_word_cnt = 0
-        self.max_match = 0
         self.FORCE_IGNORE_NAME = '~~FORCE~IGNORE~~'
+        self.cache_name = f'{name}s.cache'
+        self.format_name = functools.lru_cache(maxsize=8192)(
+            self._format_name_impl)
+        self._match_cache = functools.lru_cache(maxsize=65536)(
+            self._check_if_exists_impl)
 
-        self.update_info()
-
-    def format_name(self, name):
-        """Used to get a clean, uniform name with pesky characters removed"""
-        return self._rm_double_space(self._rm_symbol(self._rm_squote(
-            self._rm_hyph(name.lower()))))
-
-    def _rm_symbol(self, name):
-        """removes odd characters that should never be in a obj name"""
-        return name.replace('?', ' ').replace(',', ' ').replace('.', ' ') \
-            .replace('!', ' ').replace('(', ' ').replace(')', ' ') \
-            .replace(':', ' ').replace('"', ' ').replace('+', ' ') \
-            .replace('[', ' ').replace(']', ' ')
-
-    def _rm_squote(self, name):
-        """removes single quotes"""
-        return name.replace("'", '').replace('’', '')
-
-    def _lower(self, name):
-        """exists to pass along to alternative names func"""
-        return name.lower()
+        if not self.load_cache():
+            self.update_info()
 
-    def _rm_hyph(self, name):
-        """swaps typical joining characters with spaces"""
-        return name.replace('-', ' ').replace('_', ' ')
+    @classmethod
+    def _format_name_impl(cls, name):
+        """Used to get a clean, uniform name with pesky characters removed.
+            Called through the memoized self.format_name
+        """
+        return cls._rm_double_space(
+            name.lower().translate(cls._FORMAT_TABLE))
 
-    def _rm_beta(self, name):
+    @staticmethod
+    def _rm_beta(name):
         """removes beta tag (possible error from wiki)"""
         return name.replace('_beta', '').replace('_Beta', '') \
             .replace('Beta', '').replace('beta', '')
 
-    def _append_s(self, name):
+    @staticmethod
+    def _append_s(name):
         """makes things plural
             (simple method prone to error, but will do for now)
         """
         return f'{name}s'
 
-    def _rm_double_space(self, name):
+    @staticmethod
+    def _rm_double_space(name):
         while '  ' in name:
-            pos = name.find('  ')
-            name = name[:pos] + name[pos+1:]
+            name = name.replace('  ', ' ')
         return name
 
-    def _rm_article_at_start(self, name):
+    @staticmethod
+    def _rm_article_at_start(name):
         articles = ['the', 'a', 'an']
         test_name = name.lower()
         for article in articles:
@@ -103,21 +130,39 @@ class STSWikiReader:
         """creates a massive list of possible mistypes for a
             specific name, used as an aid for matching user input
         """
-        names = set()
-        actions = [self._rm_symbol, self._rm_squote, self._lower,
-                   self._rm_article_at_start, self._rm_hyph, self._rm_beta,
-                   self._append_s]
-        # Weird edge case for beta tag on wiki vs beta the card
-        if name.lower().strip() == 'beta':
-            actions.remove(self._rm_beta)
-
-        for outer in range(len(actions)):
-            temp_name = name
-            for inner in range(len(actions) - outer):
-                temp_name = self._rm_double_space(
-                    actions[outer+inner](temp_name))
-                names.add(temp_name)
-        return list(names)
+        return _gen_alternative_names_cached(name)
+
+    def _gen_canonical_names(self, name):
+        """formats name and its alternatives the way phrases from a title
+            are formatted, which are the only forms a phrase can equal
+        """
+        names = {self.format_name(new_name).strip()
+                 for new_name in (name, *self._gen_alternative_names(name))}
+        names.discard('')
+        return names
+
+    def _build_buckets(self):
+        """groups base_set by word count, keeping the words at each position
+            (and the same words reversed) in their own list so a whole
+            bucket is scored in one call
+        """
+        buckets = dict()
+        for item_name in self.base_set:
+            split_item_name = item_name.split(' ')
+            names, columns = buckets.setdefault(
+                len(split_item_name), ([], [[] for _ in split_item_name]))
+            names.append(item_name)
+            for column, word in zip(columns, split_item_name):
+                column.append(word)
+
+        self._buckets = dict()
+        for word_cnt, (names, columns) in buckets.items():
+            column_coefs = [np.minimum(0.1, 1.0 / np.array(
+                [max(len(word), 1) for word in column])) for column in columns]
+            rev_columns = [[word[::-1] for word in column]
+                           for column in columns]
+            self._buckets[word_cnt] = (names, columns, rev_columns,
+                                       column_coefs)
 
     def update_info(self):
         """goes to the web and finds information provided by the links"""
@@ -125,102 +170,210 @@ class STSWikiReader:
         seen_list = set()
 
         # fetch data from links and update object with most recent info
-        for link in self.links:
-            res = requests.get(link, verify=False)
-            for cur_name in self.parse_names(
-                    soup(res.text, features="html.parser")):
-                if cur_name.lower() in self.ignore_list:
+        with ThreadPoolExecutor(max_workers=max(len(self.links), 1)) as pool:
+            responses = list(pool.map(
+                lambda link: SESSION.get(link, verify=False, timeout=10),
+                self.links))
+        for res in responses:
+            for cur_name in self.parse_names(LexborHTMLParser(res.content)):
+                if cur_name.lower() in self.ignore_set:
                     continue
                 seen_list.add(cur_name)
-                # if we haven't seen it before, add it to our look up list.
-                if (cur_name not in self.base_set) \
-                        and (not cur_name.startswith('Category:')):
-                    self.base_set.add(cur_name)
+                # add it to our look up list, see _build_name_map
+                if not cur_name.startswith('Category:'):
                     self.real_names.add(cur_name)
-                    self.fake_name_map[cur_name] = cur_name
-                    self.max_name_word_cnt = max(self.max_name_word_cnt,
-                                                 len(cur_name.split(' ')))
-
-                    for new_name in self._gen_alternative_names(cur_name):
-                        if new_name.strip():
-                            self.base_set.add(new_name)
-                            self.fake_name_map[new_name] = cur_name
 
         # handle deleted data from wiki
-        recalc_max_name_word_cnt = False
-        for cur_name in self.real_names - seen_list:
-            for new_name in self._gen_alternative_names(cur_name):
-                self.base_set.remove(new_name)
-                del self.fake_name_map[new_name]
-
-            if not recalc_max_name_word_cnt \
-                    and self.max_name_word_cnt == len(cur_name.split(' ')):
-                recalc_max_name_word_cnt = True
-            self.base_set.remove(cur_name)
-            self.real_names.remove(cur_name)
-            del self.fake_name_map[cur_name]
-
-        if recalc_max_name_word_cnt:
-            self.max_name_word_cnt = 0
-            for cur_name in self.real_names:
-                self.max_name_word_cnt = max(self.max_name_word_cnt,
-                                             len(cur_name.split(' ')))
+        self.real_names &= seen_list
 
         # finalize update
         self.last_update = datetime.datetime.utcnow()
+        self._build_name_map()
+        self._build_lookups()
+        self.save_cache()
         log(f'Found {len(self.real_names)} {self.name}s')
 
+    def _build_name_map(self):
+        """maps every canonical name to the real name it came from.
+            Names can share alternatives, so each real name keeps its own
+            formatted name and the rest go to the first real name in sorted
+            order, the same no matter which names come and go
+        """
+        self.fake_name_map = dict()
+        for cur_name in sorted(self.real_names):
+            for new_name in self._gen_canonical_names(cur_name):
+                self.fake_name_map.setdefault(new_name, cur_name)
+        for cur_name in self.real_names:
+            own_name = self.format_name(cur_name).strip()
+            if own_name:
+                self.fake_name_map[own_name] = cur_name
+            # the name as written on the wiki is kept for the fuzzy search
+            # too (phrases are formatted, so they never equal it exactly).
+            # Jaro pairs letters greedily, and a name's lowercase first
+            # letter can pair with a later one in a phrase missing it
+            # ('kabeko' vs 'akabeko'), costing a transposition the cased
+            # 'Akabeko' doesn't. A kept joiner lines up words typed
+            # together ('betabeta' vs 'beta_beta') better than a space
+            for wiki_name in (cur_name, cur_name.lower(),
+                              cur_name.translate(self._FORMAT_TABLE)):
+                wiki_name = self._rm_double_space(wiki_name).strip()
+                if wiki_name:
+                    self.fake_name_map.setdefault(wiki_name, cur_name)
+        self.base_set = set(self.fake_name_map)
+
+    def _build_lookups(self):
+        """rebuilds everything derived from base_set"""
+        self._build_buckets()
+        self.max_name_word_cnt = max(self._buckets, default=0)
+        self.clear_cache()
+
+    def load_cache(self):
+        """loads names saved by save_cache, so a restart can skip the wiki.
+            Returns False if there is no usable cache (missing, made from
+            other links or ignore list, or older than 15 days)
+        """
+        if not os.path.exists(self.cache_name):
+            return False
+        try:
+            with open(self.cache_name, 'rb') as stream:
+                data = pickle.load(stream)
+        except Exception:
+            log(f'Failed to read {self.cache_name}\n{traceback.format_exc()}')
+            return False
+        if data['links'] != self.links \
+                or data.get('ignore_list') != self.ignore_list \
+                or datetime.datetime.utcnow() - data['last_update'] \
+                > datetime.timedelta(days=15):
+            return False
+
+        self.real_names = data['real_names']
+        self.base_set = data['base_set']
+        self.fake_name_map = data['fake_name_map']
+        self.last_update = data['last_update']
+        self._build_lookups()
+        log(f'Loaded {len(self.real_names)} {self.name}s from '
+            f'{self.cache_name}')
+        return True
+
+    def save_cache(self):
+        """saves our names for load_cache"""
+        data = {'links': self.links,
+                'ignore_list': self.ignore_list,
+                'real_names': self.real_names,
+                'base_set': self.base_set,
+                'fake_name_map': self.fake_name_map,
+                'last_update': self.last_update}
+        with open(self.cache_name, 'wb') as stream:
+            pickle.dump(data, stream)
+
+    def clear_cache(self):
+        """forgets memoized matches, needed whenever our names or
+            ignore list change
+        """
+        self._match_cache.cache_clear()
+
     def check_if_similar(self, name):
         """uses similarity check to see if the passed in name may match
-            any of our found or generated names
+            any of our found or generated names.
+            Returns (matched, real name or None, score)
+        """
+        cur, max_match = self._check_if_similar_impl(self.format_name(name))
+        return cur is not None, cur, max_match
+
+    def _check_if_similar_impl(self, name):
+        """scores an already formatted name against our names and returns
+            (best real name or None, best score)
         """
-        name = self.format_name(name)
         split_name = name.split(' ')
-        word_thresh = 0.9**len(split_name)
-        self.max_match = 0
-        self.cur = None
-        for item_name in self.base_set:
-            split_item_name = item_name.split(' ')
-            if len(split_name) == len(split_item_name):
-                word_check = 1
-                for i in range(len(split_name)):
-                    word_check *= self.strcmp.similarity(
-                        split_name[i], split_item_name[i])
-                    word_check *= self.strcmp.similarity(
-                        split_name[i][::-1], split_item_name[i][::-1])
-
-                if word_check > self.max_match:
-                    self.max_match = word_check
-                    if word_check >= word_thresh:
-                        self.cur = self.fake_name_map[item_name]
-        return self.cur is not None
+        word_cnt = len(split_name)
+        if word_cnt not in self._buckets:
+            return None, 0
+        word_thresh = 0.9**word_cnt
+        names, columns, rev_columns, column_coefs = self._buckets[word_cnt]
+        # each word score is at most 1, so a match needs every one to reach
+        # word_thresh, and the prefix bonus only applies above a Jaro of 0.7.
+        # Lower pairs can't match, which lets rapidfuzz bail out early
+        cutoff = min(word_thresh, 0.7)
+        scores = np.ones(len(names))
+        for word, column, rev_column, choice_coefs in zip(
+                split_name, columns, rev_columns, column_coefs):
+            # reversing changes neither length, so both share coefs
+            coefs = prefix_coefs(word, choice_coefs)
+            scores *= jaro_winkler(word, column, coefs, cutoff)
+            scores *= jaro_winkler(word[::-1], rev_column, coefs, cutoff)
+
+        best = int(np.argmax(scores))
+        max_match = float(scores[best])
+        cur = None
+        if max_match >= word_thresh:
+            cur = self.fake_name_map[names[best]]
+        return cur, max_match
+
+    def _may_be_similar(self, name):
+        """cheap rejection before the fuzzy path, a name we can match
+            has a word count bucket to be scored against
+        """
+        return len(self.format_name(name).split(' ')) in self._buckets
 
     def check_if_exists(self, name, update=True):
         """Used to check if a name is a perfect match for any found
-            names or is close enough to call a match
+            names or is close enough to call a match.
+            Returns (matched, real name or FORCE_IGNORE_NAME, score)
         """
         if update and datetime.datetime.utcnow() - self.last_update \
                 > datetime.timedelta(days=15):
             self.update_info()
+        return self._match_cache(name)
 
-        if name.lower() in self.ignore_list:
-            self.cur = self.FORCE_IGNORE_NAME
-            self.max_match = 1
-            return True
-
-        res = name in self.real_names
-        if res:
-            self.cur = name
-            self.max_match = 1
-        elif name in self.fake_name_map.keys():
-            self.cur = self.fake_name_map[name]
-            self.max_match = 1
-            res = True
-        else:
+    def check_if_known(self, name):
+        """Used to check if a name is ignored or a perfect match for any
+            found or generated names, without the similarity check.
+            Returns (matched, real name or FORCE_IGNORE_NAME, score)
+        """
+        if name.lower() in self.ignore_set:
+            return True, self.FORCE_IGNORE_NAME, 1
+
+        # real names map to themselves, so one lookup covers both
+        cur = self.fake_name_map.get(name)
+        if cur is not None:
+            return True, cur, 1
+        return False, None, 0
+
+    def _check_if_exists_impl(self, name):
+        """does the work for check_if_exists. Called through the memoized
+            self._match_cache, see clear_cache
+        """
+        res = self.check_if_known(name)
+        if not res[0] and self._may_be_similar(name):
             res = self.check_if_similar(name)
         return res
 
 
+@functools.lru_cache(maxsize=4096)
+def _gen_alternative_names_cached(name):
+    """backs STSWikiReader._gen_alternative_names, kept at module level so
+        every reader shares the cache and refreshes reuse earlier results
+    """
+    reader = STSWikiReader
+    name = reader._format_name_impl(name).strip()
+    # formatting already removes symbols, quotes, case and hyphens, which
+    # leaves the article, the beta tag and the plural. Each run of those,
+    # in order, gives one alternative
+    actions = [reader._rm_article_at_start, reader._rm_beta,
+               reader._append_s]
+    # Weird edge case for beta tag on wiki vs beta the card
+    if name == 'beta':
+        actions.remove(reader._rm_beta)
+
+    names = set()
+    for start in range(len(actions)):
+        temp_name = name
+        for action in actions[start:]:
+            temp_name = reader._rm_double_space(action(temp_name)).strip()
+            names.add(temp_name)
+    return tuple(names)
+
+
 class RedditBot:
     last_update = None
 
@@ -228,6 +381,9 @@ class RedditBot:
         self.REDDIT = self.login()
         self.SUBREDDIT = self.REDDIT.subreddit('slaythespire')
         self.readers = readers
+        self._checked_fh = open('checked.txt', 'a', buffering=8192)
+        self._unflushed_ids = 0
+        atexit.register(self.flush_checked)
         self.NEW_LINE = '\n\n'
         self.FIRST_REPLY_TEMPLATE = 'I am {:0.1f}% confident you mentioned ' \
                                     + '{} in your post.'
@@ -266,6 +422,7 @@ class RedditBot:
                     self.process_submission(post)
 
             except Exception as e:
+                self.flush_checked()
                 log(str(e))
                 traceback.print_stack(e)
                 sleep(60)
@@ -286,58 +443,85 @@ class RedditBot:
             else:
                 reader.ignore_list = []
                 reader.links = []
+            reader.ignore_set = set(reader.ignore_list)
+            reader.clear_cache()
             reader.last_update = datetime.datetime.utcnow()
 
         self.last_update = datetime.datetime.utcnow()
 
+    def _match_at(self, words, word_pos, max_len, exact):
+        """finds the best reader match for the phrases starting at word_pos,
+            longest first. With exact set only known names are accepted.
+            Returns (word_pos, real name, score, reader, phrase word count)
+            or None
+        """
+        cur = None
+        best = 0
+        match_reader = None
+        match_len = 0
+        for offset in range(max_len, 0, -1):
+            phrase = ' '.join(words[word_pos:word_pos+offset])
+            for reader in self.readers:
+                if exact:
+                    matched, match, score = reader.check_if_known(phrase)
+                else:
+                    matched, match, score = reader.check_if_exists(phrase,
+                                                                   False)
+                if matched:
+                    if score > best:
+                        cur = match
+                        best = score
+                        match_reader = reader
+                        match_len = offset
+                        if best == 1:
+                            break
+            if best == 1:
+                break
+        if cur is None:
+            return None
+        return word_pos, cur, best, match_reader, match_len
+
     def check_all_word_combos(self, title, on_true):
         """breaks the sentence/title into words/groups of words, and tries
             to match it with data in a reader
         """
 
-        mentions = dict()
+        mentions = defaultdict(float)
         for reader in self.readers:
             if datetime.datetime.utcnow() - reader.last_update \
                     > datetime.timedelta(days=15):
                 reader.update_info()
 
-        skip = 0
-        words = list(filter(None, reader.format_name(
+        # titles are nearly always new, so they skip the memoized
+        # format_name and leave its entries to the phrases
+        words = list(filter(None, STSWikiReader._format_name_impl(
             title.replace('/', ' ').strip()).split(' ')))
-        for word_pos in range(len(words)):
-            if skip:
-                skip -= 1
+        word_cnt = len(words)
+        max_name_word_cnt = max(reader.max_name_word_cnt
+                                for reader in self.readers)
+
+        # an exact phrase scores 1, above any fuzzy one, so when one starts
+        # here the longest such phrase is the match and the fuzzy search
+        # can be skipped for this position
+        found = []
+        word_pos = 0
+        while word_pos < word_cnt:
+            max_len = min(max_name_word_cnt, word_cnt - word_pos)
+            match = self._match_at(words, word_pos, max_len, True) \
+                or self._match_at(words, word_pos, max_len, False)
+            if match is None:
+                word_pos += 1
                 continue
-            cur = None
-            best = 0
-            match_type = None
-            match_len = 0
-            for offset in range(reader.max_name_word_cnt, 0, -1):
-                if word_pos + offset > len(words):
-                    continue
-                phrase = ' '.join(words[word_pos:word_pos+offset])
-                for reader in self.readers:
-                    if reader.check_if_exists(phrase):
-                        if reader.max_match > best:
-                            cur = reader.cur
-                            best = reader.max_match
-                            match_type = reader.name
-                            match_len = offset
-                            if best == 1:
-                                break
-                if best == 1:
-                    break
-            if cur is not None:
-                if cur != reader.FORCE_IGNORE_NAME:
-                    if not mentions:
-                        log(title)
-                    print('{} Mention: {} | {:0.2f}'.format(
-                        match_type, cur, best))
-                    if cur in mentions.keys():
-                        mentions[cur] = max(best*100, mentions[cur])
-                    else:
-                        mentions[cur] = best*100
-                skip = match_len-1
+            found.append(match)
+            word_pos += match[-1]
+
+        for _, cur, best, reader, _ in found:
+            if cur != reader.FORCE_IGNORE_NAME:
+                if not mentions:
+                    log(title)
+                print('{} Mention: {} | {:0.2f}'.format(
+                    reader.name, cur, best))
+                mentions[cur] = max(best*100, mentions[cur])
 
         if mentions:
             on_true(mentions)
@@ -345,8 +529,9 @@ class RedditBot:
 
     def post_reply(self, items):
         """formats and posts the data to reddit"""
-        reply = ""
-        grouped_items = dict()
+        # replies are built up as a list of parts and joined once per post
+        parts = []
+        grouped_items = defaultdict(list)
         abo = ['Alpha', 'Beta', 'Omega']
         names = []
         # group by percent
@@ -354,35 +539,32 @@ class RedditBot:
             k = int(items[key]*10)
             if key in abo:
                 abo.remove(key)
-            if k not in grouped_items.keys():
-                grouped_items[k] = [key]
-            else:
-                grouped_items[k].append(key)
+            grouped_items[k].append(key)
         template = self.FIRST_REPLY_TEMPLATE
         for key in sorted(grouped_items, reverse=True):
             values = grouped_items[key]
             names.extend(values)
             if len(values) == 1:
-                reply += template.format(key/10, f'{values[0]}') + \
-                         self.NEW_LINE
+                parts.append(template.format(key/10, f'{values[0]}'))
             else:
                 item_list = ', '.join([f'{k}' for k in values[:-1]])
                 # oxford comma
                 if len(values) != 2:
                     item_list += ','
                 item_list += ' and ' + f'{values[-1]}'
-                reply += template.format(key/10, item_list) + self.NEW_LINE
+                parts.append(template.format(key/10, item_list))
+            parts.append(self.NEW_LINE)
             template = self.REPLY_TEMPLATE
 
         if len(abo) % 3 != 0:
             names.append(abo[0])
-            reply += f'You may also be interested in {abo[0]}'
+            parts.append(f'You may also be interested in {abo[0]}')
             if len(abo) == 2:
                 names.append(abo[1])
-                reply += f' and {abo[1]}'
-            reply += '.' + self.NEW_LINE
+                parts.append(f' and {abo[1]}')
+            parts.append('.' + self.NEW_LINE)
 
-        log(reply)
+        log(''.join(parts))
 
         # ## DEBUG TEXT# ##
         global time_at_run
@@ -395,7 +577,8 @@ class RedditBot:
         end = self.NEW_LINE + \
             self.NEW_LINE + \
             self.END_TEXT
-        reply += self.NEW_LINE + '-'*50 + self.NEW_LINE
+        parts.append(self.NEW_LINE + '-'*50 + self.NEW_LINE)
+        reply_len = sum(len(part) for part in parts)
         try:
             res = requests.post(sts_descr_site+describe_path, json={'names':names})
         except requests.exceptions.HTTPError as e:
@@ -409,22 +592,25 @@ class RedditBot:
         reply_cnt = 0
         for entry in entries:
             reply_cnt += 1
-            reply += entry.descr()
-            if len(reply) >= 8000:
+            parts.append(entry.descr())
+            reply_len += len(entry.descr())
+            if reply_len >= 8000:
                 log('posting next reply')
-                reply += end
-                cur_post = cur_post.reply(reply)
-                reply = ''
+                parts.append(end)
+                cur_post = cur_post.reply(''.join(parts))
+                parts = []
+                reply_len = 0
                 end = ''
                 reply_cnt = 0
             else:
-                reply += '\n\n'
+                parts.append('\n\n')
+                reply_len += 2
 
-        if reply:
+        if parts:
             log('posting next reply')
-            reply += end
-            cur_post = cur_post.reply(reply)
-            reply = ''
+            parts.append(end)
+            cur_post = cur_post.reply(''.join(parts))
+            parts = []
             end = ''
 
     def process_submission(self, post):
@@ -437,24 +623,31 @@ class RedditBot:
         if (post.id not in checked_ids) and 'daily discussion' not in title.lower():
             print(f'checking {post.id}')
             self.check_all_word_combos(title, self.post_reply)
-            checked_ids.append(post.id)
-            with open('checked.txt', 'a') as f:
-                f.write('\n' + post.id)
+            checked_ids.add(post.id)
+            self._checked_fh.write('\n' + post.id)
+            self._unflushed_ids += 1
+            if self._unflushed_ids >= 32:
+                self.flush_checked()
+
+    def flush_checked(self):
+        """writes buffered checked post ids out to checked.txt"""
+        self._checked_fh.flush()
+        self._unflushed_ids = 0
 
 
-checked_ids = []
+checked_ids = set()
 can_post = True
 time_at_run = datetime.datetime.utcnow()
 bs_text = None
 
 if __name__ == '__main__':
-    def relic_parse(page_soup):
-        return [a.text for a in page_soup.find_all(
-            class_='category-page__member-link')]
+    def relic_parse(page):
+        return [a.text() for a in page.css('a.category-page__member-link')]
 
-    def card_parse(page_soup):
-        return [row.find_next('a').text for row in
-                page_soup.find('table').find_all('tr')]
+    def card_parse(page):
+        rows = page.css_first('table').css('tr')
+        return [row.css_first('a').text() for row in rows
+                if row.css_first('a') is not None]
 
     def get_data(filename):
         if os.path.exists(filename):
@@ -462,7 +655,7 @@ if __name__ == '__main__':
                 return [k.strip() for k in f.readlines()]
 
     # Read from files
-    checked_ids = get_data('checked.txt')
+    checked_ids = set(get_data('checked.txt') or [])
     RELIC_IGNORE = [i.lower() for i in get_data('relic.ignore')]
     RELIC_LINKS = get_data('relic.link')
     CARD_IGNORE = [i.lower() for i in get_data('card.ignore')]
@@ -479,6 +672,8 @@ if __name__ == '__main__':
                                CARD_IGNORE,
                                card_parse)
     redditbot = RedditBot([RelicReader, CardReader])
+    # exit normally on SIGTERM so atexit flushes checked.txt
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     redditbot.start()
 
     # FOR TESTING
@@ -6,8 +6,9 @@ import json
 from STSTypes import *
 
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup as soup
-from strsimpy.jaro_winkler import JaroWinkler
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 
 from flask import Flask, request
@@ -15,10 +16,18 @@ from flask import Flask, request
 
 WikiEntries = {}
 EntryByName = {}
+# read-only copy of EntryByName for the request handlers, see update_snapshot
+_entry_snapshot = {}
 
 cache_update = None
 force_update = False
 
+# enough pooled connections for the description workers, see update_info
+DESC_WORKERS = 16
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_maxsize=DESC_WORKERS))
+SESSION.mount('http://', HTTPAdapter(pool_maxsize=DESC_WORKERS))
+
 def create_entry_key(name, entry_type):
     return ';'.join([name, entry_type])
 
@@ -26,6 +35,15 @@ def create_entry_key(entry: WikiEntry):
     return ';'.join([entry.name(), entry.entry_type()])
 
 
+def update_snapshot():
+    """swaps in a fresh copy of EntryByName for the request handlers.
+        Swapping the reference is atomic, so a handler keeps whichever
+        copy it grabbed and never sees an update half done
+    """
+    global _entry_snapshot
+    _entry_snapshot = dict(EntryByName)
+
+
 def log(text):
     """helper to log to file and print at the same time"""
     log_text = text.replace('\n', '\n\t')
@@ -35,8 +53,6 @@ class STSWikiReader:
     """Reads data from website, creates a lookup map of item names, and does
         soft string matching to find possible mentions of the item parsed
     """
-    strcmp = JaroWinkler()
-
     def __init__(self, name, reader_type, links, ignore_list, parse_names, gen_desc):
         self.last_update = cache_update if cache_update and not force_update else datetime.datetime.utcnow()
         self.name = name
@@ -67,9 +83,13 @@ class STSWikiReader:
         seen_list = set()
 
         # fetch data from links and update object with most recent info
-        for link in self.links:
-            res = requests.get(link, verify=False)
-            res_soup = soup(res.text, features="html.parser")
+        with ThreadPoolExecutor(max_workers=max(len(self.links), 1)) as pool:
+            responses = list(pool.map(
+                lambda link: SESSION.get(link, verify=False, timeout=10),
+                self.links))
+        pending = []
+        for res in responses:
+            res_soup = soup(res.text, features="lxml")
             _class = res_soup.find(id='firstHeading').text.replace('Cards', '').strip()
             for cur_name, data in self.parse_names(res_soup):
                 if cur_name.lower() in self.ignore_list:
@@ -79,21 +99,26 @@ class STSWikiReader:
                 # if we haven't seen it before, add it to our look up list.
                 if not cur_name.startswith('Category:'):
                     entry = WikiEntry(cur_name, self.reader_type, '', data['link'])
-                    entry['descr'] = self.gen_desc(entry, data)
-                    
-                    WikiEntries[create_entry_key(entry)] = entry
-                    EntryByName[cur_name.lower()] = entry
-                    self.base_set.add(cur_name)
+                    pending.append((entry, data))
+
+        # descriptions may fetch a page per entry, so build them in parallel
+        with ThreadPoolExecutor(max_workers=DESC_WORKERS) as pool:
+            descrs = list(pool.map(lambda args: self.gen_desc(*args), pending))
+        for (entry, data), descr in zip(pending, descrs):
+            entry['descr'] = descr
+            WikiEntries[create_entry_key(entry)] = entry
+            EntryByName[entry.name().lower()] = entry
+            self.base_set.add(entry.name())
 
         #remove missing entries
         missing = self.base_set - seen_list
         if missing:
             for item in missing:
-                del WikiEntries[create_entry_key(item, self.reader_type)]
-                del EntryByName[item]
+                del WikiEntries[create_entry_key(EntryByName.pop(item.lower()))]
                 self.base_set.remove(item)
 
         # finalize update
+        update_snapshot()
         self.last_update = datetime.datetime.utcnow()
         log(f'Found {len(seen_list)} {self.name}s')
 
@@ -107,8 +132,8 @@ def select_single(page, txt):
     
 
 def build_relic_desc(entry, data):
-    res = requests.get(entry.link(), verify=False)
-    page = soup(res.text, features='html.parser')
+    res = SESSION.get(entry.link(), verify=False, timeout=10)
+    page = soup(res.text, features='lxml')
     
     desc   = select_single(page, 'div[data-source="description"]')
     rarity = select_single(page, 'div[data-source="rarity"]')
@@ -162,8 +187,8 @@ def update_entries():
         entry = WikiEntries[key]
         if entry.entry_type() != EntryCardType:
             continue
-        res = requests.get(entry.link, verify=False)
-        page = soup(res.text, features='html.parser')
+        res = SESSION.get(entry.link, verify=False, timeout=10)
+        page = soup(res.text, features='lxml')
         desc = ''
         if entry.entry_type() == EntryRelicType:
             desc = build_relic_desc(page)
@@ -187,6 +212,7 @@ def load_cache(name):
                 entry = WikiEntry(**entries[key])
                 WikiEntries[key] = entry
                 EntryByName[entry.name().lower()] = entry
+            update_snapshot()
     
 
 def save_cache(name):
@@ -218,24 +244,16 @@ req = None
 
 @app.route('/describe', methods=['POST'])
 def describe_many():
-    global EntryByName
     global req
-    result = []
+    snap = _entry_snapshot
     req = request
-    names = [s.lower() for s in request.json['names']]
-    for name in names:
-        if name in EntryByName:
-            result.append(EntryByName[name])
+    entries = map(snap.get, map(str.lower, request.json['names']))
+    result = [entry for entry in entries if entry is not None]
     return {'entries': result}
 
 @app.route('/describe/<name>')
 def describe(name):
-    global EntryByName
-    result = None
-    name = name.lower()
-    if name in EntryByName:
-        result = EntryByName[name]
-    return {'entries': result}
+    return {'entries': _entry_snapshot.get(name.lower())}
 
 @app.route('/update')
 def update():
@@ -316,7 +334,6 @@ if __name__ == '__main__':
                 return [k.strip() for k in f.readlines()]
 
     # Read from files
-    checked_ids = get_data('checked.txt')
     RELIC_IGNORE = [i.lower() for i in get_data('relic.ignore')]
     RELIC_LINKS = get_data('relic.link')
     CARD_IGNORE = [i.lower() for i in get_data('card.ignore')]